@@ -1,18 +1,80 @@
-import os, json
+import os, hashlib, logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-import psycopg2
-from psycopg2.extras import RealDictCursor
-import redis
+from fastapi.responses import ORJSONResponse, Response
+import asyncpg
+import orjson
+import redis.asyncio as redis
+
+log = logging.getLogger(__name__)
 
 INTERNAL = os.getenv('INTERNAL_SERVICE_TOKEN','changeme')
+# Set to 0 when DATABASE_URL points at PgBouncer in transaction pooling mode.
+STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', '1024'))
+POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '4'))
+POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '32'))
+# List responses are cached under q:{domain}:{hash}; the ETL worker deletes q:{domain}:* after upserts.
+CACHE_TTL = {'cves': 60, 'advisories': 120}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.pool = await asyncpg.create_pool(os.getenv('DATABASE_URL'), min_size=POOL_MIN_SIZE, max_size=POOL_MAX_SIZE,
+                                               statement_cache_size=STATEMENT_CACHE_SIZE)
+    app.state.redis = redis.from_url(os.getenv('REDIS_URL','redis://redis:6379/0'))
+    yield
+    await app.state.pool.close()
+    await app.state.redis.aclose()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 app.add_middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'])
 
-conn = psycopg2.connect(os.getenv('DATABASE_URL'))
-conn.autocommit = True
-r = redis.from_url(os.getenv('REDIS_URL','redis://redis:6379/0'))
+def _list_sql(table, order_by, conds):
+    """
+    Builds one statement per combination of active filters, keyed by bitmask (first filter = highest bit).
+    A fixed set of SQL texts lets asyncpg's per-connection statement cache reuse prepared plans.
+    Postgres renders the whole {"items": [...], "total": n} page as one JSON text value.
+    A page past the end returns no rows to carry _total, so fall back to a plain COUNT(*);
+    COALESCE never evaluates that subquery when the page has rows.
+    """
+    out = {}
+    for mask in range(1 << len(conds)):
+        active = [c for i, c in enumerate(conds) if mask >> (len(conds) - 1 - i) & 1]
+        where = (' WHERE ' + ' AND '.join(c.format(n=n) for n, c in enumerate(active, 1))) if active else ''
+        out[mask] = (f"SELECT json_build_object('items', COALESCE(json_agg(to_jsonb(t) - '_total' ORDER BY {order_by}), '[]'), "
+                     f"'total', COALESCE(MAX(t._total), (SELECT COUNT(*) FROM \"{table}\"{where})))::text "
+                     f'FROM (SELECT *, COUNT(*) OVER() AS _total FROM "{table}"{where} ORDER BY {order_by} '
+                     f'LIMIT ${len(active)+1} OFFSET ${len(active)+2}) t')
+    return out
+
+CVES_SQL = _list_sql('Cve', '"modifiedAt" DESC NULLS LAST',
+                     ['(id ILIKE ${n} OR description ILIKE ${n})', '"cvssSeverity" = ${n}', '"isKev" = ${n}'])
+ADVISORIES_SQL = _list_sql('Advisory', '"publishedAt" DESC NULLS LAST',
+                           ['(title ILIKE ${n} OR summary ILIKE ${n} OR "summaryTech" ILIKE ${n})', 'source = ${n}'])
+
+def _active(*filters):
+    mask = 0
+    for _, on in filters: mask = mask << 1 | on
+    return mask, [value for value, on in filters if on]
+
+def _cache_key(domain, *args):
+    return f'q:{domain}:{hashlib.blake2b(orjson.dumps(args), digest_size=16).hexdigest()}'
+
+# The cache is best-effort: a Redis error falls through to Postgres instead of failing the request.
+async def _cache_get(key):
+    try:
+        body = await app.state.redis.get(key)
+    except redis.RedisError as e:
+        log.warning('cache get %s failed: %s', key, e)
+        return None
+    return Response(body, media_type='application/json') if body is not None else None
+
+async def _cache_put(key, domain, body):
+    try:
+        await app.state.redis.setex(key, CACHE_TTL[domain], body)
+    except redis.RedisError as e:
+        log.warning('cache put %s failed: %s', key, e)
+    return Response(body, media_type='application/json')
 
 @app.get('/health')
 async def health():
@@ -20,39 +82,31 @@ async def health():
 
 @app.get('/admin/status')
 async def status():
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    cur.execute('SELECT id, kind, label, "lastRunAt", "lastStatus" FROM "DataSource" ORDER BY kind')
-    return {'dataSources': cur.fetchall()}
+    async with app.state.pool.acquire() as con:
+        rows = await con.fetch('SELECT id, kind, label, "lastRunAt", "lastStatus" FROM "DataSource" ORDER BY kind')
+    return ORJSONResponse({'dataSources': [dict(row) for row in rows]})
 
 @app.post('/admin/run/{sourceKind}')
 async def run_now(sourceKind: str, request: Request):
     token = request.query_params.get('token')
     if token != INTERNAL: raise HTTPException(401, 'Unauthorized')
-    r.publish('manual_run', sourceKind.upper())
+    await app.state.redis.publish('manual_run', sourceKind.upper())
     return {'queued': sourceKind.upper()}
 
 @app.get('/cves')
 async def cves(query: str = '', severity: str = '', isKev: bool | None = None, limit: int = 50, offset: int = 0):
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    conds=[]; params=[]
-    if query:
-        conds.append('(id ILIKE %s OR sourceRaw::text ILIKE %s)'); params += [f'%{query}%', f'%{query}%']
-    if severity:
-        conds.append('"cvssSeverity" = %s'); params.append(severity)
-    if isKev is not None:
-        conds.append('"isKev" = %s'); params.append(isKev)
-    where = ('WHERE ' + ' AND '.join(conds)) if conds else ''
-    cur.execute(f'SELECT * FROM "Cve" {where} ORDER BY "modifiedAt" DESC NULLS LAST LIMIT %s OFFSET %s', params+[limit, offset])
-    return {'items': cur.fetchall()}
+    key = _cache_key('cves', query, severity, isKev, limit, offset)
+    if (cached := await _cache_get(key)) is not None: return cached
+    mask, args = _active((f'%{query}%', bool(query)), (severity, bool(severity)), (isKev, isKev is not None))
+    async with app.state.pool.acquire() as con:
+        body = await con.fetchval(CVES_SQL[mask], *args, limit, offset)
+    return await _cache_put(key, 'cves', body)
 
 @app.get('/advisories')
 async def advisories(query: str = '', source: str = '', limit: int = 50, offset: int = 0):
-    cur = conn.cursor(cursor_factory=RealDictCursor)
-    conds=[]; params=[]
-    if query:
-        conds.append('(title ILIKE %s OR summary ILIKE %s OR summaryTech ILIKE %s)'); params += [f'%{query}%',]*3
-    if source:
-        conds.append('source = %s'); params.append(source)
-    where = ('WHERE ' + ' AND '.join(conds)) if conds else ''
-    cur.execute(f'SELECT * FROM "Advisory" {where} ORDER BY "publishedAt" DESC NULLS LAST LIMIT %s OFFSET %s', params+[limit, offset])
-    return {'items': cur.fetchall()}
\ No newline at end of file
+    key = _cache_key('advisories', query, source, limit, offset)
+    if (cached := await _cache_get(key)) is not None: return cached
+    mask, args = _active((f'%{query}%', bool(query)), (source, bool(source)))
+    async with app.state.pool.acquire() as con:
+        body = await con.fetchval(ADVISORIES_SQL[mask], *args, limit, offset)
+    return await _cache_put(key, 'advisories', body)
@@ -0,0 +1,13 @@
+import asyncio
+import redis.asyncio as redis
+import main
+
+class DownRedis:
+    async def get(self, key): raise redis.ConnectionError('down')
+    async def setex(self, key, ttl, body): raise redis.ConnectionError('down')
+
+def test_cache_errors_fall_through(monkeypatch):
+    monkeypatch.setattr(main.app.state, 'redis', DownRedis(), raising=False)
+    assert asyncio.run(main._cache_get('q:cves:x')) is None
+    response = asyncio.run(main._cache_put('q:cves:x', 'cves', '{"items": [], "total": 0}'))
+    assert response.body == b'{"items": [], "total": 0}'
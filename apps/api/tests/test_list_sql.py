@@ -0,0 +1,26 @@
+import main
+
+def test_active_mask_puts_first_filter_in_highest_bit():
+    assert main._active(('q', False), ('HIGH', False), (True, False)) == (0b000, [])
+    assert main._active(('q', True), ('HIGH', False), (True, False)) == (0b100, ['q'])
+    assert main._active(('q', False), ('HIGH', True), (False, True)) == (0b011, ['HIGH', False])
+    assert main._active(('q', True), ('HIGH', True), (True, True)) == (0b111, ['q', 'HIGH', True])
+
+def test_list_sql_has_one_statement_per_mask():
+    assert sorted(main.CVES_SQL) == list(range(8))
+    assert sorted(main.ADVISORIES_SQL) == list(range(4))
+
+def test_list_sql_numbers_placeholders_in_filter_order():
+    sql = main._list_sql('T', 'x DESC', ['a = ${n}', 'b = ${n}', 'c = ${n}'])
+    assert ' WHERE ' not in sql[0]
+    assert 'LIMIT $1 OFFSET $2' in sql[0]
+    assert 'WHERE a = $1 AND c = $2' in sql[0b101] and 'LIMIT $3 OFFSET $4' in sql[0b101]
+    assert 'WHERE b = $1 LIMIT' not in sql[0b010] and 'WHERE b = $1 ORDER BY' in sql[0b010]
+    # The empty-page COUNT(*) fallback repeats the same filters.
+    assert sql[0b011].count('WHERE b = $1 AND c = $2') == 2
+
+def test_handler_args_line_up_with_sql_placeholders():
+    mask, args = main._active(('%x%', True), ('', False), (True, True))
+    sql = main.CVES_SQL[mask]
+    assert '(id ILIKE $1 OR description ILIKE $1)' in sql and '"isKev" = $2' in sql
+    assert f'LIMIT ${len(args) + 1} OFFSET ${len(args) + 2}' in sql
@@ -0,0 +1,9 @@
+-- One-time backfill for columns added after rows were already ingested.
+-- Idempotent; safe to re-run. Apply after migrations with psql:
+--   docker compose exec -T db psql -U postgres tip < packages/db/prisma/backfill.sql
+
+-- "Cve".description feeds /cves?query=; older rows only carry it inside "sourceRaw".
+UPDATE "Cve" SET description = (
+  SELECT d->>'value' FROM jsonb_array_elements("sourceRaw"->'descriptions') d
+  WHERE d->>'lang' = 'en' LIMIT 1)
+WHERE description IS NULL AND jsonb_typeof("sourceRaw"->'descriptions') = 'array';
@@ -0,0 +1,19 @@
+-- Indexes Prisma's schema language cannot express (NULLS LAST ordering).
+-- They match the ORDER BY of the API list endpoints, giving Postgres the rows
+-- already in order so it can skip the sort step. The list query's
+-- COUNT(*) OVER() total still reads every matching row before LIMIT applies.
+-- Apply after migrations with psql (CONCURRENTLY cannot run inside a transaction):
+--   docker compose exec -T db psql -U postgres tip < packages/db/prisma/indexes.sql
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "Cve_modifiedAt_desc_idx"
+  ON "Cve" ("modifiedAt" DESC NULLS LAST);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "Cve_cvssSeverity_modifiedAt_desc_idx"
+  ON "Cve" ("cvssSeverity", "modifiedAt" DESC NULLS LAST);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "Advisory_publishedAt_desc_idx"
+  ON "Advisory" ("publishedAt" DESC NULLS LAST);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "Advisory_source_publishedAt_desc_idx"
+  ON "Advisory" (source, "publishedAt" DESC NULLS LAST);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "OsvVuln_publishedAt_desc_idx"
+  ON "OsvVuln" ("publishedAt" DESC NULLS LAST);
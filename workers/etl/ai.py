@@ -1,4 +1,6 @@
-import os, requests
+import atexit, os, re, html, hashlib, orjson
+from cache import r as cache
+from clients.http import Http
 
 BASE = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
 MODEL = os.getenv("OPENROUTER_MODEL", "meta-llama/llama-3.1-8b-instruct:free")
@@ -11,42 +13,104 @@ HEADERS = {
     "X-Title": "TIP Phase1 Summarizer"         # optional
 }
 
-EXEC_SYS = "You summarize security advisories for executives. Be concise (<=80 words)."
-TECH_SYS = "You summarize security advisories for security engineers. Return 3–5 terse bullets (affected products, CVEs, mitigations)."
+# One long-lived session for every summary call: auth headers are set once and
+# slow completions never tie up connections in the shared ETL pool.
+client = Http(headers=HEADERS)
+atexit.register(client.session.close)
 
-def _chat(system_prompt: str, user_text: str) -> str | None:
+SUMMARY_SYS = (
+    "You summarize security advisories. The user sends one or more numbered advisories. "
+    "Return a JSON object {\"summaries\": [...]} with exactly one entry per advisory, in the same order. "
+    "Each entry is an object with two string fields: "
+    "\"exec\": a concise summary for executives (<=80 words); "
+    "\"tech\": 3–5 terse bullets for security engineers (affected products, CVEs, mitigations)."
+)
+
+# Anthropic and Gemini models only reuse a cached prompt prefix when it carries an explicit
+# cache_control breakpoint; OpenRouter's other providers cache prefixes automatically.
+if MODEL.startswith(("anthropic/", "google/gemini")):
+    SYSTEM_MESSAGE = {"role": "system", "content": [
+        {"type": "text", "text": SUMMARY_SYS, "cache_control": {"type": "ephemeral"}}
+    ]}
+else:
+    SYSTEM_MESSAGE = {"role": "system", "content": SUMMARY_SYS}
+
+CACHE_TTL = 30*24*60*60
+BATCH_SIZE = 10
+TOKENS_PER_SUMMARY = 400
+
+def _field(value) -> str:
+    if isinstance(value, list):
+        return "\n".join(str(v) for v in value)
+    return (value or "").strip()
+
+_TAG = re.compile(r"<[^>]+>")
+_SPACE = re.compile(r"\s+")
+
+def _normalize(text: str) -> str:
+    # Feeds re-publish the same advisory with different markup, entities, spacing or case.
+    return _SPACE.sub(" ", html.unescape(_TAG.sub(" ", text))).strip().casefold()
+
+def _cache_key(text: str) -> str:
+    return f"ai:sum:{MODEL}:{hashlib.blake2b(_normalize(text).encode(), digest_size=16).hexdigest()}"
+
+def _chat(texts: list[str]) -> list[dict] | None:
     if not KEY:
         return None
+    user_text = "\n---\n".join(f"Advisory {i}:\n{t}" for i, t in enumerate(texts, 1))
     try:
-        r = requests.post(
+        data = client.post_json(
             f"{BASE}/chat/completions",
-            headers=HEADERS,
             json={
                 "model": MODEL,
                 "messages": [
-                    {"role": "system", "content": system_prompt},
+                    SYSTEM_MESSAGE,
                     {"role": "user", "content": user_text}
                 ],
+                "response_format": {"type": "json_object"},
                 "temperature": 0.2,
-                "max_tokens": 320
+                "max_tokens": TOKENS_PER_SUMMARY * len(texts)
             },
-            timeout=40
+            timeout=40 + 10 * len(texts)
         )
-        r.raise_for_status()
-        data = r.json()
-        return data["choices"][0]["message"]["content"].strip()
+        out = orjson.loads(data["choices"][0]["message"]["content"]).get("summaries") or []
+        if len(out) != len(texts):
+            return None
+        return [{"exec": _field(o.get("exec")), "tech": _field(o.get("tech"))} for o in out]
     except Exception:
         return None
 
+def summarize_batch(texts: list[str]) -> list:
+    """
+    Returns one {"exec": str, "tech": str} or None per input text, in order.
+    Cache misses are sent BATCH_SIZE advisories per request; a failed request yields None for its items.
+    Results are cached in Redis by model and normalized-content hash, so unchanged entries skip the API.
+    """
+    results = [None] * len(texts)
+    pending = {}  # cache key -> (representative text, indices sharing that key)
+    for i, text in enumerate(texts):
+        if not text:
+            continue
+        key = _cache_key(text)
+        cached = cache.get(key)
+        if cached:
+            results[i] = orjson.loads(cached)
+        else:
+            pending.setdefault(key, (text, []))[1].append(i)
+    misses = list(pending.items())
+    for start in range(0, len(misses), BATCH_SIZE):
+        chunk = misses[start:start + BATCH_SIZE]
+        for (key, (_, indices)), result in zip(chunk, _chat([text for _, (text, _) in chunk]) or []):
+            if not (result["exec"] or result["tech"]):
+                continue
+            cache.setex(key, CACHE_TTL, orjson.dumps(result))
+            for i in indices:
+                results[i] = result
+    return results
+
 def summarize(text: str):
     """
     Returns {"exec": str, "tech": str} or None.
     If OPENROUTER_API_KEY is not set or a call fails, returns None (pipeline continues).
     """
-    if not text:
-        return None
-    exec_sum = _chat(EXEC_SYS, text)
-    tech_sum = _chat(TECH_SYS, text)
-    if exec_sum or tech_sum:
-        return {"exec": exec_sum or "", "tech": tech_sum or ""}
-    return None
\ No newline at end of file
+    return summarize_batch([text])[0]
\ No newline at end of file
@@ -0,0 +1,3 @@
+import os
+import redis
+r = redis.from_url(os.getenv('REDIS_URL', 'redis://redis:6379/0'), decode_responses=True)
\ No newline at end of file
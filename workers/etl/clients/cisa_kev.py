@@ -1,8 +1,8 @@
-import pandas as pd
-from .http import Http
+import csv, io
+from .http import http
 CSV_URL = "https://www.cisa.gov/sites/default/files/feeds/known_exploited_vulnerabilities.csv"
-def fetch():
-    http = Http()
-    r = http.get(CSV_URL)
-    df = pd.read_csv(pd.io.common.StringIO(r.text))
-    return set(df['cveID'].dropna().astype(str).unique())
\ No newline at end of file
+def fetch(validators=None):
+    """Returns (ids, validators); ids is None when the catalogue is unchanged since validators were issued."""
+    r, validators = http.get_if_modified(CSV_URL, validators)
+    if r is None: return None, validators
+    return {row['cveID'] for row in csv.DictReader(io.StringIO(r.text)) if row.get('cveID')}, validators
\ No newline at end of file
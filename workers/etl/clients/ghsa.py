@@ -1,11 +1,10 @@
 import os
-from .http import Http
+from .http import http
 GQL = "https://api.github.com/graphql"
 def fetch_updated_since(updated_iso: str):
     token = os.getenv('GITHUB_TOKEN')
     if not token:
         return []
-    http = Http()
     query = {
       "query": """
       query($since: DateTime!) {
@@ -16,5 +15,5 @@ def fetch_updated_since(updated_iso: str):
       """,
       "variables": {"since": updated_iso}
     }
-    r = http.post(GQL, json=query, headers={"Authorization": f"bearer {token}"}).json()
+    r = http.post_json(GQL, json=query, headers={"Authorization": f"bearer {token}"})
     return r.get('data',{}).get('securityAdvisories',{}).get('nodes',[])
\ No newline at end of file
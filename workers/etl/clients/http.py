@@ -1,21 +1,49 @@
-import time, requests
+import atexit, orjson, requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 DEFAULT_TIMEOUT = 30
+POOL_SIZE = 32
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+USER_AGENT = 'TIP-Platform/1.0'
 class Http:
-    def __init__(self, retries=3, backoff=1.5):
-        self.retries = retries
-        self.backoff = backoff
+    def __init__(self, retries=3, backoff=1.0, headers=None):
+        # Retries connection errors and RETRY_STATUSES only, honouring Retry-After; other 4xx fail fast.
+        # read=0: a request that timed out after being sent (e.g. a slow LLM completion) is never re-sent.
+        retry = Retry(total=retries, read=0, backoff_factor=backoff, backoff_jitter=0.5,
+                      status_forcelist=RETRY_STATUSES, allowed_methods=frozenset({'GET', 'POST'}),
+                      respect_retry_after_header=True, raise_on_status=False)
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = USER_AGENT
+        self.session.headers.update(headers or {})
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
     def get(self, url, **kwargs):
         return self._call('GET', url, **kwargs)
+    def get_if_modified(self, url, validators=None, **kwargs):
+        """Conditional GET. Returns (response, validators); response is None when the server answers 304."""
+        headers = dict(kwargs.pop('headers', None) or {})
+        validators = validators or {}
+        if validators.get('etag'): headers['If-None-Match'] = validators['etag']
+        if validators.get('lastModified'): headers['If-Modified-Since'] = validators['lastModified']
+        r = self._call('GET', url, headers=headers, **kwargs)
+        if r.status_code == 304:
+            return None, validators
+        return r, {'etag': r.headers.get('ETag'), 'lastModified': r.headers.get('Last-Modified')}
     def post(self, url, **kwargs):
         return self._call('POST', url, **kwargs)
+    def post_json(self, url, **kwargs):
+        return orjson.loads(self.post(url, **kwargs).content)
     def _call(self, method, url, **kwargs):
         timeout = kwargs.pop('timeout', DEFAULT_TIMEOUT)
-        for i in range(self.retries + 1):
-            try:
-                r = requests.request(method, url, timeout=timeout, **kwargs)
-                r.raise_for_status()
-                return r
-            except Exception:
-                if i == self.retries:
-                    raise
-                time.sleep(self.backoff ** (i+1))
\ No newline at end of file
+        if 'json' in kwargs:
+            # Encode with orjson straight to bytes instead of letting requests go through stdlib json.
+            kwargs['data'] = orjson.dumps(kwargs.pop('json'))
+            kwargs['headers'] = {**(kwargs.get('headers') or {}), 'Content-Type': 'application/json'}
+        r = self.session.request(method, url, timeout=timeout, **kwargs)
+        r.raise_for_status()
+        return r
+
+# Shared by all clients so connections (and TLS sessions) are reused across calls and tasks.
+http = Http()
+atexit.register(http.session.close)
\ No newline at end of file
@@ -1,22 +1,87 @@
+import ijson, queue, threading, time
+from ijson.common import ObjectBuilder
 from datetime import datetime, timedelta, timezone
-from .http import Http
+from .http import http
 BASE = "https://services.nvd.nist.gov/rest/json/cves/2.0"
+PAGE_SIZE = 2000
+CHUNK_SIZE = 500
+PAGE_DELAY = 6  # NVD asks clients to sleep ~6s between requests
+def _cves(events, page):
+    # Builds each vulnerabilities[].cve object from parse events; NVD sends totalResults ahead of the array.
+    for prefix, event, value in events:
+        if prefix == 'totalResults':
+            page['totalResults'] = value
+        elif prefix == 'vulnerabilities.item.cve' and event == 'start_map':
+            builder = ObjectBuilder()
+            builder.event(event, value)
+            depth = 1
+            for _, event, value in events:
+                if event in ('start_map', 'start_array'): depth += 1
+                elif event in ('end_map', 'end_array'): depth -= 1
+                builder.event(event, value)
+                if not depth: break
+            yield builder.value
+def _stream_page(params, page):
+    # Parse the page incrementally off the socket instead of materialising the whole JSON document.
+    r = http.get(BASE, params=params, stream=True)
+    r.raw.decode_content = True
+    try:
+        yield from _cves(ijson.parse(r.raw, use_float=True), page)
+    finally:
+        r.close()
 def fetch_since(last_dt: datetime):
-    http = Http()
+    """Yields lists of up to CHUNK_SIZE CVE dicts, parsed as each result page downloads."""
     start = (last_dt or datetime.now(timezone.utc) - timedelta(days=2))
     end = datetime.now(timezone.utc)
     params = {
         'lastModStartDate': start.isoformat(timespec='seconds').replace('+00:00','Z'),
         'lastModEndDate': end.isoformat(timespec='seconds').replace('+00:00','Z'),
-        'startIndex': 0
+        'resultsPerPage': PAGE_SIZE
     }
-    items = []
+    start_index = 0
     while True:
-        r = http.get(BASE, params=params).json()
-        vulns = r.get('vulnerabilities', [])
-        for v in vulns:
-            items.append(v.get('cve', {}))
-        if len(vulns) == 0 or params['startIndex'] + len(vulns) >= r.get('totalResults', 0):
+        page = {}
+        seen = 0
+        chunk = []
+        for cve in _stream_page({**params, 'startIndex': start_index}, page):
+            chunk.append(cve)
+            seen += 1
+            if len(chunk) == CHUNK_SIZE:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+        # NVD may return a short page mid-set: page until totalResults, and stop on an empty page.
+        start_index += seen
+        if not seen or start_index >= page.get('totalResults', 0):
             break
-        params['startIndex'] += len(vulns)
-    return items
\ No newline at end of file
+        time.sleep(PAGE_DELAY)
+def prefetch(chunks, depth=2):
+    """Drives the chunks generator on a background thread so the next page downloads (and sleeps) while the caller writes."""
+    q = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+    def put(item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=1)
+                return True
+            except queue.Full:
+                pass
+        return False
+    def produce():
+        try:
+            for chunk in chunks:
+                if not put(chunk): return
+            put(done)
+        except Exception as e:
+            put(e)
+        finally:
+            chunks.close()
+    threading.Thread(target=produce, name='nvd-prefetch', daemon=True).start()
+    try:
+        while (item := q.get()) is not done:
+            if isinstance(item, Exception): raise item
+            yield item
+    finally:
+        stop.set()
\ No newline at end of file
@@ -1,10 +1,6 @@
-from .http import Http
+from .http import http
 OSV_QUERY = "https://api.osv.dev/v1/query"
-def fetch_since(updated_since_iso: str, ecosystems=("PyPI","npm","Maven","Go","RubyGems")):
-    http = Http()
-    out = []
-    for eco in ecosystems:
-        payload = {"ecosystem": eco, "modified": updated_since_iso}
-        r = http.post(OSV_QUERY, json=payload).json()
-        out.extend(r.get('vulns', []))
-    return out
\ No newline at end of file
+ECOSYSTEMS = ("PyPI","npm","Maven","Go","RubyGems")
+def fetch_ecosystem(ecosystem: str, updated_since_iso: str):
+    payload = {"ecosystem": ecosystem, "modified": updated_since_iso}
+    return http.post_json(OSV_QUERY, json=payload).get('vulns', [])
\ No newline at end of file
@@ -1,4 +1,21 @@
 import feedparser
-def fetch(url: str):
-    feed = feedparser.parse(url)
-    return feed.entries
\ No newline at end of file
+from lxml import etree
+from .http import http
+_PARSER = etree.XMLParser(recover=True, resolve_entities=False, no_network=True)
+# entry key (as feedparser names it) -> RSS 2.0 item element
+_FIELDS = (('title', 'title'), ('link', 'link'), ('summary', 'description'), ('published', 'pubDate'), ('id', 'guid'))
+def _parse_rss(content: bytes):
+    # Fast path for plain RSS 2.0; anything else (Atom, RDF, namespaced items) yields [] and goes to feedparser.
+    try:
+        root = etree.fromstring(content, parser=_PARSER)
+    except etree.XMLSyntaxError:
+        return []
+    if root is None: return []
+    return [{key: text.strip() for key, tag in _FIELDS if (text := item.findtext(tag)) is not None}
+            for item in root.iterfind('channel/item')]
+def fetch(url: str, validators=None):
+    """Returns (entries, validators); entries is None when the feed is unchanged since validators were issued."""
+    # Download through the shared pooled session; the parsers only see the bytes.
+    r, validators = http.get_if_modified(url, validators, timeout=15)
+    if r is None: return None, validators
+    return _parse_rss(r.content) or feedparser.parse(r.content).entries, validators
\ No newline at end of file
@@ -1,43 +1,119 @@
-import os
-import psycopg2
-from psycopg2.extras import Json
-conn = psycopg2.connect(os.getenv('DATABASE_URL'))
-conn.autocommit = True
+import io, os, threading
+from contextlib import contextmanager
+import orjson
+from psycopg2.pool import ThreadedConnectionPool
+from psycopg2.extras import Json as _Json, execute_values
+from cache import r as cache
+# Worker threads (see celery_app.conf in tasks.py) each hold at most one connection; getconn raises rather than blocks when exhausted.
+ETL_CONCURRENCY = int(os.getenv('ETL_CONCURRENCY', '16'))
+POOL_MAX_SIZE = ETL_CONCURRENCY + 4
+_pool = None
+_pool_lock = threading.Lock()
 
-def upsert_cve(cve, kev_ids):
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadedConnectionPool(1, POOL_MAX_SIZE, os.getenv('DATABASE_URL'))
+    return _pool
+
+@contextmanager
+def db():
+    """Borrows an autocommit connection from the shared pool; worker threads never share one at a time."""
+    pool = _get_pool()
+    conn = pool.getconn()
+    try:
+        if not conn.autocommit: conn.autocommit = True
+        yield conn
+    finally:
+        pool.putconn(conn, close=bool(conn.closed))
+
+PAGE_SIZE = 1000
+
+def _orjson_default(o):
+    # stdlib json encodes tuple subclasses such as feedparser's time.struct_time as arrays; orjson does not.
+    if isinstance(o, tuple): return list(o)
+    raise TypeError
+
+def _dumps(obj):
+    return orjson.dumps(obj, default=_orjson_default).decode()
+
+def Json(obj):
+    # sourceRaw payloads are the bulk of every upsert; encode them with orjson rather than stdlib json.
+    return _Json(obj, dumps=_dumps)
+
+def _copy_value(v):
+    # Renders v as COPY ... (FORMAT csv, NULL '\N') reads it: an unquoted \N for NULL, everything else quoted,
+    # so a literal '\N' string is not read back as NULL. Booleans become t/f, lists array literals.
+    if v is None: return '\\N'
+    if isinstance(v, bool): v = 't' if v else 'f'
+    elif isinstance(v, list):
+        v = '{' + ','.join('"' + x.replace('\\', '\\\\').replace('"', '\\"') + '"' for x in v) + '}'
+    return '"' + str(v).replace('"', '""') + '"'
+
+def _copy_rows(cur, table, columns, rows):
+    buf = io.StringIO()
+    for row in rows:
+        buf.write(','.join(_copy_value(v) for v in row) + '\n')
+    buf.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buf)
+
+def _dedupe(rows):
+    # ON CONFLICT cannot touch the same row twice in one statement; keep the last copy of each id.
+    return list({row[0]: row for row in rows if row}.values())
+
+def _invalidate(domain):
+    # Drop the API's cached list responses (see CACHE_TTL in apps/api/main.py).
+    keys = list(cache.scan_iter(f'q:{domain}:*', count=500))
+    if keys: cache.delete(*keys)
+
+def _cve_row(cve, kev_ids):
     cve_id = cve.get('id') or cve.get('CVE',{}).get('CVE_data_meta',{}).get('ID')
-    if not cve_id: return
-    metrics = (cve.get('metrics') or {}).get('cvssMetricV31') or []
+    if not cve_id: return None
+    metrics = cve.get('metrics') or {}
+    metrics = metrics.get('cvssMetricV31') or metrics.get('cvssMetricV30') or metrics.get('cvssMetricV3')
     score = severity = None
     if metrics:
         m = metrics[0].get('cvssData', {})
         score = m.get('baseScore'); severity = m.get('baseSeverity')
-    cwes = []
-    for p in cve.get('weaknesses', []):
-        for d in p.get('description', []):
-            if d.get('value'): cwes.append(d['value'])
-    cpes = []
-    for c in cve.get('configurations', []):
-        for n in c.get('nodes', []):
-            for m in n.get('cpeMatch', []):
-                if m.get('criteria'): cpes.append(m['criteria'])
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO "Cve" (id, publishedAt, modifiedAt, sourceRaw, cvssScore, cvssSeverity, cwes, cpes, isKev)
-        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
+    description = None
+    for d in cve.get('descriptions', ()):
+        if d.get('lang') == 'en':
+            description = d.get('value'); break
+    cwes = [v for p in cve.get('weaknesses', ()) for d in p.get('description', ()) if (v := d.get('value'))]
+    cpes = [v for c in cve.get('configurations', ()) for n in c.get('nodes', ()) for m in n.get('cpeMatch', ()) if (v := m.get('criteria'))]
+    return (cve_id, cve.get('published'), cve.get('lastModified'), _dumps(cve), description, score, severity, cwes, cpes, cve_id in kev_ids)
+
+_CVE_COLUMNS = ('id', '"publishedAt"', '"modifiedAt"', '"sourceRaw"', 'description', '"cvssScore"', '"cvssSeverity"', 'cwes', 'cpes', '"isKev"')
+
+def upsert_cves(cves, kev_ids):
+    """COPYs the batch into a temp staging table, then merges it into "Cve" with one INSERT ... SELECT."""
+    rows = _dedupe(_cve_row(c, kev_ids) for c in cves)
+    if not rows: return 0
+    columns = ', '.join(_CVE_COLUMNS)
+    with db() as conn, conn, conn.cursor() as cur:
+        cur.execute('CREATE TEMP TABLE cve_stage (LIKE "Cve" INCLUDING DEFAULTS) ON COMMIT DROP')
+        _copy_rows(cur, 'cve_stage', _CVE_COLUMNS, rows)
+        cur.execute(f"""
+        INSERT INTO "Cve" ({columns})
+        SELECT {columns} FROM cve_stage
         ON CONFLICT (id) DO UPDATE SET
-          publishedAt=EXCLUDED.publishedAt,
-          modifiedAt=EXCLUDED.modifiedAt,
-          sourceRaw=EXCLUDED.sourceRaw,
-          cvssScore=EXCLUDED.cvssScore,
-          cvssSeverity=EXCLUDED.cvssSeverity,
+          "publishedAt"=EXCLUDED."publishedAt",
+          "modifiedAt"=EXCLUDED."modifiedAt",
+          "sourceRaw"=EXCLUDED."sourceRaw",
+          description=EXCLUDED.description,
+          "cvssScore"=EXCLUDED."cvssScore",
+          "cvssSeverity"=EXCLUDED."cvssSeverity",
           cwes=EXCLUDED.cwes,
           cpes=EXCLUDED.cpes,
-          isKev=EXCLUDED.isKev
-    """, (cve_id, cve.get('published'), cve.get('lastModified'), Json(cve), score, severity, cwes, cpes, cve_id in kev_ids))
+          "isKev"=EXCLUDED."isKev"
+        """)
+    _invalidate('cves')
+    return len(rows)
 
-def upsert_osv(v):
+def _osv_row(v):
     vid = v.get('id')
+    if not vid: return None
     eco = pkg = None
     if v.get('affected'):
         a = v['affected'][0]
@@ -47,40 +123,101 @@ def upsert_osv(v):
     if v.get('severity'):
         sev = v['severity'][0]
         severity = sev.get('type')
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO "OsvVuln" (id, ecosystem, package, affected, sourceRaw, publishedAt, modifiedAt, cvssScore, cvssSeverity)
-        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
-        ON CONFLICT (id) DO UPDATE SET
-          ecosystem=EXCLUDED.ecosystem,
-          package=EXCLUDED.package,
-          affected=EXCLUDED.affected,
-          sourceRaw=EXCLUDED.sourceRaw,
-          publishedAt=EXCLUDED.publishedAt,
-          modifiedAt=EXCLUDED.modifiedAt,
-          cvssScore=EXCLUDED.cvssScore,
-          cvssSeverity=EXCLUDED.cvssSeverity
-    """, (vid, eco, pkg, Json(v.get('affected')), Json(v), v.get('published'), v.get('modified'), score, severity))
-
-def upsert_advisory(source, entry, summaries=None):
+    return (vid, eco, pkg, Json(v.get('affected')), Json(v), v.get('published'), v.get('modified'), score, severity)
+
+def upsert_osvs(vulns):
+    rows = _dedupe(_osv_row(v) for v in vulns)
+    if not rows: return 0
+    with db() as conn, conn.cursor() as cur:
+        execute_values(cur, """
+            INSERT INTO "OsvVuln" (id, ecosystem, package, affected, "sourceRaw", "publishedAt", "modifiedAt", "cvssScore", "cvssSeverity")
+            VALUES %s
+            ON CONFLICT (id) DO UPDATE SET
+              ecosystem=EXCLUDED.ecosystem,
+              package=EXCLUDED.package,
+              affected=EXCLUDED.affected,
+              "sourceRaw"=EXCLUDED."sourceRaw",
+              "publishedAt"=EXCLUDED."publishedAt",
+              "modifiedAt"=EXCLUDED."modifiedAt",
+              "cvssScore"=EXCLUDED."cvssScore",
+              "cvssSeverity"=EXCLUDED."cvssSeverity"
+        """, rows, page_size=PAGE_SIZE)
+    return len(rows)
+
+def _advisory_row(source, entry, summaries=None):
     title = getattr(entry,'title', None) or entry.get('title')
     link = getattr(entry,'link', None) or entry.get('link')
     guid = getattr(entry,'id', None) or entry.get('id') or link or title
     pub = getattr(entry,'published', None) or entry.get('published')
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO "Advisory" (id, source, title, link, publishedAt, sourceRaw, summary, summaryTech, tags)
-        VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
-        ON CONFLICT (id) DO UPDATE SET
-          source=EXCLUDED.source,
-          title=EXCLUDED.title,
-          link=EXCLUDED.link,
-          publishedAt=EXCLUDED.publishedAt,
-          sourceRaw=EXCLUDED.sourceRaw,
-          summary=COALESCE(EXCLUDED.summary, "Advisory".summary),
-          summaryTech=COALESCE(EXCLUDED.summaryTech, "Advisory".summaryTech)
-    """, (guid, source, title, link, pub, Json(getattr(entry, '.__dict__', None) or dict(entry)), (summaries or {}).get('exec'), (summaries or {}).get('tech'), []))
+    return (guid, source, title, link, pub, Json(dict(entry)), (summaries or {}).get('exec'), (summaries or {}).get('tech'), [])
+
+def upsert_advisories(source, items):
+    """items: iterable of (entry, summaries) pairs."""
+    rows = _dedupe(_advisory_row(source, entry, sums) for entry, sums in items)
+    if not rows: return 0
+    with db() as conn, conn.cursor() as cur:
+        execute_values(cur, """
+            INSERT INTO "Advisory" (id, source, title, link, "publishedAt", "sourceRaw", summary, "summaryTech", tags)
+            VALUES %s
+            ON CONFLICT (id) DO UPDATE SET
+              source=EXCLUDED.source,
+              title=EXCLUDED.title,
+              link=EXCLUDED.link,
+              "publishedAt"=EXCLUDED."publishedAt",
+              "sourceRaw"=EXCLUDED."sourceRaw",
+              summary=COALESCE(EXCLUDED.summary, "Advisory".summary),
+              "summaryTech"=COALESCE(EXCLUDED."summaryTech", "Advisory"."summaryTech")
+        """, rows, page_size=PAGE_SIZE)
+    _invalidate('advisories')
+    return len(rows)
+
+def summarized_advisory_links(sources, days=30):
+    """Links of recent advisories from sources that already carry a summary."""
+    with db() as conn, conn.cursor() as cur:
+        cur.execute('SELECT link FROM "Advisory" WHERE source = ANY(%s) AND link IS NOT NULL AND summary IS NOT NULL '
+                    'AND "publishedAt" > NOW() - %s * INTERVAL \'1 day\'', (list(sources), days))
+        return {row[0] for row in cur}
+
+def sync_kev_flags(kev_ids):
+    """
+    Brings "Cve"."isKev" in line with the KEV catalogue, touching only rows whose flag changes.
+    Returns (flagged, cleared) row counts.
+    """
+    if not kev_ids: return 0, 0
+    # One statement, one round trip: both data-modifying CTEs see the same snapshot and touch disjoint rows.
+    with db() as conn, conn.cursor() as cur:
+        cur.execute("""
+            WITH kev(id) AS (SELECT DISTINCT UNNEST(%s::text[])),
+            flagged AS (
+              UPDATE "Cve" SET "isKev" = true FROM kev
+              WHERE "Cve".id = kev.id AND "Cve"."isKev" IS DISTINCT FROM true RETURNING 1),
+            cleared AS (
+              UPDATE "Cve" SET "isKev" = false
+              WHERE "isKev" AND NOT EXISTS (SELECT 1 FROM kev WHERE kev.id = "Cve".id) RETURNING 1)
+            SELECT (SELECT count(*) FROM flagged), (SELECT count(*) FROM cleared)
+        """, (list(kev_ids),))
+        flagged, cleared = cur.fetchone()
+    if flagged or cleared: _invalidate('cves')
+    return flagged, cleared
+
+def get_http_validators(kind: str):
+    """Returns the {url: {"etag", "lastModified"}} map kept under "configJson".http for kind."""
+    with db() as conn, conn.cursor() as cur:
+        cur.execute('SELECT "configJson"->\'http\' FROM "DataSource" WHERE kind = %s AND "configJson" ? \'http\' LIMIT 1', (kind,))
+        row = cur.fetchone()
+    return (row and row[0]) or {}
+
+def save_http_validators(kind: str, validators: dict):
+    """Merges {url: {"etag", "lastModified"}} into "configJson".http on every DataSource of kind."""
+    if not validators: return
+    with db() as conn, conn.cursor() as cur:
+        cur.execute("""
+            UPDATE "DataSource" SET "configJson" = jsonb_set(
+              CASE WHEN jsonb_typeof("configJson") = 'object' THEN "configJson" ELSE '{}' END,
+              '{http}', COALESCE("configJson"->'http', '{}') || %s::jsonb)
+            WHERE kind = %s
+        """, (Json(validators), kind))
 
 def update_datasource_status(kind: str, status: str):
-    cur = conn.cursor()
-    cur.execute('UPDATE "DataSource" SET "lastRunAt" = NOW(), "lastStatus" = %s WHERE kind = %s', (status, kind))
\ No newline at end of file
+    with db() as conn, conn.cursor() as cur:
+        cur.execute('UPDATE "DataSource" SET "lastRunAt" = NOW(), "lastStatus" = %s WHERE kind = %s', (status, kind))
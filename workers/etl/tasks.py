@@ -1,70 +1,156 @@
 import os
-from celery import Celery
+from contextlib import closing
+from celery import Celery, chord, group
 from datetime import datetime, timezone, timedelta
+from requests import RequestException
 from clients import nvd, osv, ghsa, rss, cisa_kev
-from db import upsert_cve, upsert_osv, upsert_advisory, update_datasource_status
-from ai import summarize
+from db import (upsert_cves, upsert_osvs, upsert_advisories, sync_kev_flags, update_datasource_status,
+                get_http_validators, save_http_validators, summarized_advisory_links, ETL_CONCURRENCY)
+from ai import summarize_batch, BATCH_SIZE
+from cache import r
 
 REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
 celery_app = Celery('tasks', broker=REDIS_URL, backend=REDIS_URL)
+# Set here rather than with --concurrency so the DB pool in db.py is sized from the same value.
+celery_app.conf.worker_concurrency = ETL_CONCURRENCY
+
+# Fetch units (one feed, one ecosystem) retry on their own, so one flaky source never re-runs the others.
+RETRY = dict(autoretry_for=(RequestException,), retry_backoff=60, retry_jitter=True, max_retries=3)
+
+RSS_FEEDS = [
+    ("CISA", "https://www.cisa.gov/uscert/ncas/current-activity.xml"),
+    ("MSRC", "https://msrc.microsoft.com/update-guide/rss")
+]
+
+SYNC_INTERVAL = 8*60*60
 
 @celery_app.on_after_configure.connect
 def setup_periodic_tasks(sender, **kwargs):
-    sender.add_periodic_task(8*60*60, task_nvd_pull.s(), name='NVD every 8h')
-    sender.add_periodic_task(8*60*60, task_osv_pull.s(), name='OSV every 8h')
-    sender.add_periodic_task(8*60*60, task_ghsa_pull.s(), name='GHSA every 8h')
-    sender.add_periodic_task(8*60*60, task_cisa_kev_sync.s(), name='KEV every 8h')
-    sender.add_periodic_task(8*60*60, task_rss_pull_all.s(), name='RSS every 8h')
+    sender.add_periodic_task(SYNC_INTERVAL, task_nvd_pull.s(), name='NVD every 8h')
+    sender.add_periodic_task(SYNC_INTERVAL, task_osv_pull.s(), name='OSV every 8h')
+    sender.add_periodic_task(SYNC_INTERVAL, task_ghsa_pull.s(), name='GHSA every 8h')
+    sender.add_periodic_task(SYNC_INTERVAL, task_cisa_kev_sync.s(), name='KEV every 8h')
+    sender.add_periodic_task(SYNC_INTERVAL, task_rss_pull_all.s(), name='RSS every 8h')
 
 def _iso(dt): return dt.astimezone(timezone.utc).isoformat()
 
+KEV_KEY = 'kev:ids:v1'
+# Outlives the sync interval, so NVD pulls started on the same beat tick still find the previous run's set.
+KEV_TTL = SYNC_INTERVAL + 60*60
+
+def _cache_kev_ids(ids):
+    if ids:
+        pipe = r.pipeline()
+        pipe.delete(KEV_KEY); pipe.sadd(KEV_KEY, *ids); pipe.expire(KEV_KEY, KEV_TTL)
+        pipe.execute()
+    return ids
+
+def _kev_ids():
+    return r.smembers(KEV_KEY) or _cache_kev_ids(cisa_kev.fetch()[0])
+
 @celery_app.task
 def task_cisa_kev_sync():
-    kev = cisa_kev.fetch()
-    update_datasource_status('CISA_KEV', f"synced {len(kev)} IDs")
+    validators = get_http_validators('CISA_KEV')
+    kev, fresh = cisa_kev.fetch(validators.get(cisa_kev.CSV_URL))
+    if kev is None:
+        # 304: the catalogue, and so every isKev flag, is as of the last sync.
+        # A 304 has no body, so an expired or evicted Redis copy needs one full download to rebuild.
+        if not r.expire(KEV_KEY, KEV_TTL): _cache_kev_ids(cisa_kev.fetch()[0])
+        update_datasource_status('CISA_KEV', "not modified")
+        return 0
+    _cache_kev_ids(kev)
+    flagged, cleared = sync_kev_flags(kev)
+    # Stored only after the flags are synced, so a failed run re-downloads next time.
+    save_http_validators('CISA_KEV', {cisa_kev.CSV_URL: fresh})
+    update_datasource_status('CISA_KEV', f"synced {len(kev)} IDs ({flagged} flagged, {cleared} cleared)")
     return len(kev)
 
 @celery_app.task
 def task_nvd_pull():
     last = datetime.now(timezone.utc) - timedelta(hours=10)
-    kev = cisa_kev.fetch()
-    items = nvd.fetch_since(last)
-    for c in items: upsert_cve(c, kev)
-    update_datasource_status('NVD', f"upserted {len(items)} CVEs")
-    return len(items)
+    kev = _kev_ids()
+    count = 0
+    # Pages are fetched on a prefetch thread while this one COPYs the previous chunk.
+    # closing() stops the prefetch thread and its NVD response as soon as an upsert raises.
+    with closing(nvd.prefetch(nvd.fetch_since(last))) as pages:
+        for page in pages:
+            count += upsert_cves(page, kev)
+    update_datasource_status('NVD', f"upserted {count} CVEs")
+    return count
 
 @celery_app.task
 def task_osv_pull():
-    last = datetime.now(timezone.utc) - timedelta(hours=10)
-    vulns = osv.fetch_since(_iso(last))
-    for v in vulns: upsert_osv(v)
-    update_datasource_status('OSV', f"upserted {len(vulns)} vulns")
-    return len(vulns)
+    since = _iso(datetime.now(timezone.utc) - timedelta(hours=10))
+    chord(task_osv_pull_one.s(eco, since) for eco in osv.ECOSYSTEMS)(task_osv_done.s().on_error(task_mark_failed.s(kind='OSV')))
+    return len(osv.ECOSYSTEMS)
+
+@celery_app.task(**RETRY)
+def task_osv_pull_one(ecosystem, since):
+    return upsert_osvs(osv.fetch_ecosystem(ecosystem, since))
+
+@celery_app.task
+def task_osv_done(counts):
+    update_datasource_status('OSV', f"upserted {sum(counts)} vulns")
+    return sum(counts)
+
+@celery_app.task
+def task_mark_failed(request, exc, traceback, kind):
+    """Chord errback: a unit that exhausted its retries skips the status callback, so record the failure here."""
+    update_datasource_status(kind, f"failed: {exc!r}")
 
 @celery_app.task
 def task_ghsa_pull():
     last = datetime.now(timezone.utc) - timedelta(hours=24)
     nodes = ghsa.fetch_updated_since(_iso(last))
-    for n in nodes:
-        v = {"id": n.get('ghsaId'), "affected": [], "severity":[{"type": n.get('severity')}],
-             "published": n.get('updatedAt'), "modified": n.get('updatedAt'), "summary": n.get('summary'),
-             "references": n.get('references')}
-        upsert_osv(v)
+    upsert_osvs({"id": n.get('ghsaId'), "affected": [], "severity":[{"type": n.get('severity')}],
+                 "published": n.get('updatedAt'), "modified": n.get('updatedAt'), "summary": n.get('summary'),
+                 "references": n.get('references')} for n in nodes)
     update_datasource_status('GHSA', f"upserted {len(nodes)} advisories")
     return len(nodes)
 
+@celery_app.task
+def task_summarize_batch(texts):
+    return summarize_batch(texts)
+
+@celery_app.task
+def task_rss_store(batches, source, entries, validators):
+    """Chord callback: entries are in the same order as the flattened summary batches."""
+    summaries = [sums for batch in batches for sums in batch]
+    count = upsert_advisories(source, zip(entries, summaries))
+    save_http_validators('RSS', validators)
+    return f"{source}: upserted {count} advisories"
+
+@celery_app.task
+def task_rss_done(statuses):
+    # One status line for all feeds, written once every feed has finished.
+    update_datasource_status('RSS', '; '.join(statuses))
+    return statuses
+
 @celery_app.task
 def task_rss_pull_all():
-    feeds = [
-        ("CISA", "https://www.cisa.gov/uscert/ncas/current-activity.xml"),
-        ("MSRC", "https://msrc.microsoft.com/update-guide/rss")
-    ]
-    count = 0
-    for source, url in feeds:
-        for entry in rss.fetch(url):
-            text = getattr(entry,'summary','') or getattr(entry,'title','')
-            sums = summarize(text)
-            upsert_advisory(source, entry, sums)
-            count += 1
-    update_datasource_status('RSS', f"upserted {count} advisories")
-    return count
\ No newline at end of file
+    chord(task_rss_pull_one.s(source, url) for source, url in RSS_FEEDS)(task_rss_done.s().on_error(task_mark_failed.s(kind='RSS')))
+    return len(RSS_FEEDS)
+
+@celery_app.task(bind=True, **RETRY)
+def task_rss_pull_one(self, source, url):
+    """Returns this feed's status line; feeds with new entries hand that off to their summary chord."""
+    feed_entries, fresh = rss.fetch(url, get_http_validators('RSS').get(url))
+    if feed_entries is None:
+        return f"{source}: not modified"
+    # Feeds re-list the same items every poll: skip links already stored with a summary, and repeats within the feed.
+    seen = summarized_advisory_links([source])
+    entries = []
+    for entry in feed_entries:
+        link = entry.get('link')
+        if link:
+            if link in seen: continue
+            seen.add(link)
+        entries.append(dict(entry))
+    # Validators are saved once the entries are stored, so a failed run re-downloads the feed.
+    if not entries:
+        save_http_validators('RSS', {url: fresh})
+        return f"{source}: upserted 0 advisories"
+    # Summary batches run in parallel across workers; the store callback's status becomes this task's result.
+    texts = [e.get('summary') or e.get('title') or '' for e in entries]
+    return self.replace(chord((task_summarize_batch.s(texts[i:i + BATCH_SIZE]) for i in range(0, len(texts), BATCH_SIZE)),
+                             task_rss_store.s(source, entries, {url: fresh})))
\ No newline at end of file
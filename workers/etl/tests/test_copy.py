@@ -0,0 +1,36 @@
+import csv, io
+import db
+
+class FakeCursor:
+    def copy_expert(self, sql, buf):
+        self.sql, self.data = sql, buf.read()
+
+def _copy(rows):
+    cur = FakeCursor()
+    db._copy_rows(cur, 'cve_stage', ('id', 'description', 'cwes', '"isKev"'), rows)
+    return cur
+
+def test_null_is_the_only_unquoted_field():
+    assert db._copy_value(None) == '\\N'
+    # A real '\N' string must stay quoted, or COPY reads it back as NULL.
+    assert db._copy_value('\\N') == '"\\N"'
+
+def test_scalars_quotes_and_booleans():
+    assert db._copy_value('say "hi"') == '"say ""hi"""'
+    assert db._copy_value(7.5) == '"7.5"'
+    assert db._copy_value(True) == '"t"' and db._copy_value(False) == '"f"'
+
+def test_arrays_escape_backslashes_and_quotes():
+    assert db._copy_value(['CWE-79', 'a"b', 'c\\d', 'x,y']) == '"{""CWE-79"",""a\\""b"",""c\\\\d"",""x,y""}"'
+    assert db._copy_value([]) == '"{}"'
+
+def test_copy_rows_round_trips_through_csv():
+    rows = [('CVE-1', 'line one\nline two, with "quotes"', ['CWE-79'], True),
+            ('CVE-2', None, [], False)]
+    cur = _copy(rows)
+    assert cur.sql == "COPY cve_stage (id, description, cwes, \"isKev\") FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+    parsed = list(csv.reader(io.StringIO(cur.data)))
+    assert parsed == [['CVE-1', 'line one\nline two, with "quotes"', '{"CWE-79"}', 't'],
+                      ['CVE-2', '\\N', '{}', 'f']]
+    # Only the NULL appears unquoted on the wire.
+    assert cur.data.splitlines()[-1] == '"CVE-2",\\N,"{}","f"'
@@ -0,0 +1,8 @@
+import db
+
+def test_dedupe_keeps_last_row_per_id_in_first_seen_order():
+    rows = [('a', 1), None, ('b', 1), ('a', 2), ('c', 1), ('b', 2)]
+    assert db._dedupe(iter(rows)) == [('a', 2), ('b', 2), ('c', 1)]
+
+def test_dedupe_empty():
+    assert db._dedupe([None, None]) == []
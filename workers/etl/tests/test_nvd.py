@@ -0,0 +1,62 @@
+import io
+import orjson
+import pytest
+from clients import nvd
+
+class FakeResponse:
+    def __init__(self, body):
+        self.raw = io.BytesIO(orjson.dumps(body))
+        self.closed = False
+    def close(self):
+        self.closed = True
+
+def _page(start, count, total):
+    return {'resultsPerPage': count, 'startIndex': start, 'totalResults': total,
+            'vulnerabilities': [{'cve': {'id': f'CVE-2024-{i:05d}', 'metrics': {'cvssMetricV31': [{'cvssData': {'baseScore': 7.5}}]}}}
+                                for i in range(start, start + count)]}
+
+@pytest.fixture
+def serve(monkeypatch):
+    """Serves the given page sizes in order and records every startIndex requested."""
+    requested = []
+    def install(sizes, total):
+        def get(url, params=None, **kwargs):
+            requested.append(params['startIndex'])
+            i = len(requested) - 1
+            return FakeResponse(_page(params['startIndex'], sizes[i] if i < len(sizes) else 0, total))
+        monkeypatch.setattr(nvd.http, 'get', get)
+        monkeypatch.setattr(nvd, 'PAGE_DELAY', 0)
+        return requested
+    return install
+
+def _ids(chunks):
+    return [cve['id'] for chunk in chunks for cve in chunk]
+
+def test_pages_until_total_results_even_after_a_short_page(serve):
+    requested = serve([2000, 1500, 1000], total=4500)
+    ids = _ids(nvd.fetch_since(None))
+    assert requested == [0, 2000, 3500]
+    assert len(ids) == len(set(ids)) == 4500
+
+def test_stops_on_empty_page_before_total(serve):
+    requested = serve([2000], total=5000)
+    assert len(_ids(nvd.fetch_since(None))) == 2000
+    assert requested == [0, 2000]
+
+def test_single_page_and_chunking(serve):
+    serve([1200], total=1200)
+    chunks = list(nvd.fetch_since(None))
+    assert [len(c) for c in chunks] == [500, 500, 200]
+
+def test_cve_objects_are_built_whole_with_floats(serve):
+    serve([1], total=1)
+    [[cve]] = nvd.fetch_since(None)
+    assert cve == {'id': 'CVE-2024-00000', 'metrics': {'cvssMetricV31': [{'cvssData': {'baseScore': 7.5}}]}}
+    assert isinstance(cve['metrics']['cvssMetricV31'][0]['cvssData']['baseScore'], float)
+
+def test_prefetch_propagates_errors_and_stops_producer():
+    def chunks():
+        yield [1]
+        raise RuntimeError('boom')
+    with pytest.raises(RuntimeError):
+        list(nvd.prefetch(chunks()))
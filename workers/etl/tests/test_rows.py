@@ -0,0 +1,36 @@
+import orjson
+import db
+
+def _cve(**metrics):
+    return {'id': 'CVE-2024-0001', 'published': '2024-01-01T00:00:00', 'lastModified': '2024-01-02T00:00:00',
+            'descriptions': [{'lang': 'es', 'value': 'hola'}, {'lang': 'en', 'value': 'first'}, {'lang': 'en', 'value': 'second'}],
+            'weaknesses': [{'description': [{'value': 'CWE-79'}, {'value': ''}]}, {'description': [{'value': 'CWE-89'}]}],
+            'configurations': [{'nodes': [{'cpeMatch': [{'criteria': 'cpe:2.3:a:x:y'}]}]}],
+            'metrics': metrics}
+
+def _metric(score, severity):
+    return [{'cvssData': {'baseScore': score, 'baseSeverity': severity}}]
+
+def test_cve_row_columns():
+    row = db._cve_row(_cve(cvssMetricV31=_metric(9.8, 'CRITICAL')), {'CVE-2024-0001'})
+    assert len(row) == len(db._CVE_COLUMNS)
+    cve_id, published, modified, raw, description, score, severity, cwes, cpes, is_kev = row
+    assert (cve_id, description, score, severity, is_kev) == ('CVE-2024-0001', 'first', 9.8, 'CRITICAL', True)
+    assert cwes == ['CWE-79', 'CWE-89'] and cpes == ['cpe:2.3:a:x:y']
+    assert orjson.loads(raw)['id'] == 'CVE-2024-0001'
+
+def test_cve_row_prefers_v31_then_v30_then_v3():
+    both = _cve(cvssMetricV31=_metric(9.8, 'CRITICAL'), cvssMetricV30=_metric(5.0, 'MEDIUM'))
+    assert db._cve_row(both, set())[5:7] == (9.8, 'CRITICAL')
+    assert db._cve_row(_cve(cvssMetricV30=_metric(5.0, 'MEDIUM')), set())[5:7] == (5.0, 'MEDIUM')
+    assert db._cve_row(_cve(cvssMetricV31=[], cvssMetricV3=_metric(4.0, 'LOW')), set())[5:7] == (4.0, 'LOW')
+
+def test_cve_row_without_metrics_or_english_description():
+    cve = _cve()
+    cve['descriptions'] = [{'lang': 'es', 'value': 'hola'}]
+    cve['metrics'] = None
+    row = db._cve_row(cve, set())
+    assert row[4:7] == (None, None, None) and row[9] is False
+
+def test_cve_row_skips_records_without_id():
+    assert db._cve_row({'descriptions': []}, set()) is None
@@ -0,0 +1,51 @@
+import pytest
+from clients import rss
+
+RSS = b"""<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0"><channel><title>Feed</title>
+<item><title> Patch now </title><link>https://example.com/a</link>
+<description><![CDATA[<p>Fix &amp; mitigate</p>]]></description>
+<pubDate>Mon, 06 Oct 2025 12:00:00 GMT</pubDate><guid>a-1</guid></item>
+<item><title>No link</title></item>
+</channel></rss>"""
+
+ATOM = b"""<?xml version="1.0" encoding="utf-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom"><title>Feed</title>
+<entry><title>Atom item</title><link href="https://example.com/atom"/><id>urn:1</id>
+<updated>2025-10-06T12:00:00Z</updated><summary>Atom summary</summary></entry>
+</feed>"""
+
+class FakeResponse:
+    def __init__(self, content): self.content = content
+
+@pytest.fixture
+def serve(monkeypatch):
+    def install(content):
+        monkeypatch.setattr(rss.http, 'get_if_modified',
+                            lambda url, validators=None, **kw: (FakeResponse(content) if content is not None else None, {'etag': 'e'}))
+    return install
+
+def test_parse_rss_items_use_feedparser_keys():
+    first, second = rss._parse_rss(RSS)
+    assert first == {'title': 'Patch now', 'link': 'https://example.com/a', 'summary': '<p>Fix &amp; mitigate</p>',
+                     'published': 'Mon, 06 Oct 2025 12:00:00 GMT', 'id': 'a-1'}
+    assert second == {'title': 'No link'}
+
+@pytest.mark.parametrize('content', [ATOM, b'', b'not xml at all'])
+def test_parse_rss_yields_nothing_for_non_rss(content):
+    assert rss._parse_rss(content) == []
+
+def test_fetch_uses_lxml_for_rss(serve, monkeypatch):
+    serve(RSS)
+    monkeypatch.setattr(rss.feedparser, 'parse', lambda content: pytest.fail('feedparser should not run'))
+    entries, validators = rss.fetch('https://example.com/rss')
+    assert [e['link'] for e in entries if 'link' in e] == ['https://example.com/a'] and validators == {'etag': 'e'}
+
+def test_fetch_falls_back_to_feedparser_for_atom(serve):
+    serve(ATOM)
+    [entry], _ = rss.fetch('https://example.com/atom')
+    assert entry['link'] == 'https://example.com/atom' and entry['title'] == 'Atom item'
+
+def test_fetch_not_modified(serve):
+    serve(None)
+    assert rss.fetch('https://example.com/rss') == (None, {'etag': 'e'})